@@ -2,15 +2,26 @@
 Numba-accelerated data structures for orders, trades, and cancels.
 """
 
-from numba import int64, float64
+import numpy as np
+from numba import int64
 from numba.experimental import jitclass
 
 ORDER_SIDE_BUY: int = 1
 ORDER_SIDE_SELL: int = -1
 
+
+def price_to_ticks(price: float, tick_size: float) -> int:
+    """Convert a decimal price to integer ticks (nearest tick)."""
+    return int(round(price / tick_size))
+
+
+def ticks_to_price(ticks: int, tick_size: float) -> float:
+    """Convert integer ticks back to a decimal price."""
+    return ticks * tick_size
+
 order_spec = [
     ('order_id',   int64),
-    ('price',      float64),
+    ('price',      int64),   # ticks, 0 = market
     ('quantity',   int64),
     ('side',       int64),   # 1 = buy, -1 = sell
     ('timestamp',  int64),
@@ -25,8 +36,9 @@ class Order:
     ----------
     order_id : int64
         Unique order identifier.
-    price : float64
-        Limit price (ignored for pure market orders).
+    price : int64
+        Limit price in integer ticks (see `price_to_ticks`); ignored for
+        pure market orders.
     quantity : int64
         Remaining quantity.
     side : int64
@@ -34,7 +46,7 @@ class Order:
     timestamp : int64
         Event time in micro‑seconds.
     """
-    def __init__(self, order_id: int, price: float, quantity: int,
+    def __init__(self, order_id: int, price: int, quantity: int,
                  side: int, timestamp: int):
         self.order_id  = order_id
         self.price     = price
@@ -46,27 +58,16 @@ class Order:
         return self.quantity == 0
 
 
-trade_spec = [
-    ('maker_order_id', int64),
-    ('taker_order_id', int64),
-    ('price',          float64),
-    ('quantity',       int64),
-    ('timestamp',      int64),
-]
-
-
-@jitclass(trade_spec)
-class Trade:
-    """
-    Execution report produced by the matching engine.
-    """
-    def __init__(self, maker_order_id: int, taker_order_id: int,
-                 price: float, quantity: int, timestamp: int):
-        self.maker_order_id = maker_order_id
-        self.taker_order_id = taker_order_id
-        self.price          = price
-        self.quantity       = quantity
-        self.timestamp      = timestamp
+# Execution report produced by the matching engine.  Trades are written as
+# packed 40-byte records into a preallocated buffer (see
+# core.order_book.init_trades) rather than allocated one object at a time.
+trade_dtype = np.dtype([
+    ('maker_order_id', np.int64),
+    ('taker_order_id', np.int64),
+    ('price',          np.int64),    # ticks
+    ('quantity',       np.int64),
+    ('timestamp',      np.int64),
+])
 
 
 cancel_spec = [
@@ -1,39 +1,227 @@
 """
 Timestamp‑ordered event queue.
 
-This queue stores (timestamp, event) pairs in a binary min‑heap.  Typical usage:
+Events are stored column-wise (SoA) in a binary min‑heap jitclass, so the whole
+queue lives in contiguous NumPy arrays and can be driven from Numba code
+without boxing an `Order` per push/pop.  Typical usage:
 
-    eq = EventQueue()
-    eq.push(123, Order(...))
-    for ts, ev in eq.pop_until(200):
-        handle(ev)
+    eq = EventHeap()
+    eq.push(123, order_id, price, quantity, side, timestamp)
+    while eq.size and eq.peek_ts() <= 200:
+        ts, order_id, price, quantity, side, timestamp = eq.pop()
+        handle(...)
+
+Callers outside Numba should not pay one jitclass call per event: load the
+queue with `push_many` and drain it in chunks with `pop_due`, which pops every
+due event (up to the buffer size) into caller-owned column arrays.  Where one
+event at a time is needed, `pop_if_due` replaces the size / peek / pop trio.
+
+Events with equal timestamps pop in insertion (FIFO) order.
 """
 
-from typing import Any, Iterator, Tuple
-import heapq
+import numpy as np
+from numba import int64
+from numba.experimental import jitclass
 
+heap_spec = [
+    ('ts',        int64[:]),
+    ('seq',       int64[:]),    # insertion counter, tie-break for equal ts
+    ('order_id',  int64[:]),
+    ('price',     int64[:]),
+    ('quantity',  int64[:]),
+    ('side',      int64[:]),
+    ('timestamp', int64[:]),
+    ('size',      int64),
+    ('_next_seq', int64),
+]
 
-class EventQueue:
-    """Ring‑buffer style priority queue for micro‑second events."""
 
-    __slots__ = ("_heap",)
+@jitclass(heap_spec)
+class EventHeap:
+    """
+    Array-backed binary min‑heap keyed on (ts, seq).
 
-    def __init__(self) -> None:
-        # Each element is a (timestamp, event) tuple
-        self._heap: list[Tuple[int, Any]] = []
+    All columns are swapped together during sift-up / sift-down; capacity
+    doubles when full.
+    """
+    def __init__(self, capacity: int = 1024):
+        capacity = max(capacity, 1)
+        self.ts        = np.empty(capacity, dtype=np.int64)
+        self.seq       = np.empty(capacity, dtype=np.int64)
+        self.order_id  = np.empty(capacity, dtype=np.int64)
+        self.price     = np.empty(capacity, dtype=np.int64)
+        self.quantity  = np.empty(capacity, dtype=np.int64)
+        self.side      = np.empty(capacity, dtype=np.int64)
+        self.timestamp = np.empty(capacity, dtype=np.int64)
+        self.size      = 0
+        self._next_seq = 0
 
     # ────────────────────────── public ──────────────────────────
-    def push(self, ts: int, event: Any) -> None:
-        """Insert a new event with given timestamp."""
-        heapq.heappush(self._heap, (ts, event))
+    def push(self, ts: int, order_id: int, price: int, quantity: int,
+             side: int, timestamp: int) -> None:
+        """Insert a new order event with given timestamp."""
+        if self.size == self.ts.shape[0]:
+            self._grow()
+        i = self.size
+        self.ts[i]        = ts
+        self.seq[i]       = self._next_seq
+        self.order_id[i]  = order_id
+        self.price[i]     = price
+        self.quantity[i]  = quantity
+        self.side[i]      = side
+        self.timestamp[i] = timestamp
+        self.size += 1
+        self._next_seq += 1
+        self._sift_up(i)
+
+    def push_many(self, ts, order_id, price, quantity, side,
+                  timestamp) -> None:
+        """Insert one event per row of the given columns, in row order."""
+        for i in range(ts.shape[0]):
+            self.push(ts[i], order_id[i], price[i], quantity[i], side[i],
+                      timestamp[i])
+
+    def pop(self):
+        """
+        Remove the earliest event.
+
+        Returns
+        -------
+        (ts, order_id, price, quantity, side, timestamp)
+
+        Raises
+        ------
+        IndexError
+            If the heap is empty.
+        """
+        if self.size == 0:
+            raise IndexError("pop from an empty EventHeap")
+        out = (self.ts[0], self.order_id[0], self.price[0],
+               self.quantity[0], self.side[0], self.timestamp[0])
+        self.size -= 1
+        if self.size > 0:
+            self._move(self.size, 0)
+            self._sift_down(0)
+        return out
+
+    def pop_due(self, ts_bound: int, ts, order_id, price, quantity, side,
+                timestamp) -> int:
+        """
+        Pop events with timestamp ≤ `ts_bound`, in order, into the given
+        output columns until none is due or the columns are full.
+
+        Returns
+        -------
+        int : number of rows written
+        """
+        n = 0
+        while n < ts.shape[0]:
+            (found, ts[n], order_id[n], price[n], quantity[n], side[n],
+             timestamp[n]) = self.pop_if_due(ts_bound)
+            if not found:
+                break
+            n += 1
+        return n
 
-    def pop_until(self, ts_bound: int) -> Iterator[Tuple[int, Any]]:
+    def pop_if_due(self, ts_bound: int):
         """
-        Yield and remove all events with timestamp ≤ `ts_bound`
-        in ascending time order.
+        Pop the earliest event if its timestamp is ≤ `ts_bound`.
+
+        One call per event instead of a size / peek / pop round trip.  Every
+        int64 is a valid timestamp: "nothing due" is flagged separately.
+
+        Returns
+        -------
+        (found, ts, order_id, price, quantity, side, timestamp)
+            `found` is False (and the rest zero) if nothing is due.
+        """
+        if self.size == 0 or self.ts[0] > ts_bound:
+            return (False, 0, 0, 0, 0, 0, 0)
+        ts, order_id, price, quantity, side, timestamp = self.pop()
+        return (True, ts, order_id, price, quantity, side, timestamp)
+
+    def peek_ts(self) -> int:
+        """
+        Timestamp of the earliest event.
+
+        Raises
+        ------
+        IndexError
+            If the heap is empty.
         """
-        while self._heap and self._heap[0][0] <= ts_bound:
-            yield heapq.heappop(self._heap)
+        if self.size == 0:
+            raise IndexError("peek_ts on an empty EventHeap")
+        return self.ts[0]
 
     def __len__(self) -> int:  # convenience
-        return len(self._heap)
+        return self.size
+
+    # ────────────────────────── internal ─────────────────────────
+    def _less(self, a: int, b: int) -> bool:
+        if self.ts[a] != self.ts[b]:
+            return self.ts[a] < self.ts[b]
+        return self.seq[a] < self.seq[b]
+
+    def _move(self, src: int, dst: int) -> None:
+        self.ts[dst]        = self.ts[src]
+        self.seq[dst]       = self.seq[src]
+        self.order_id[dst]  = self.order_id[src]
+        self.price[dst]     = self.price[src]
+        self.quantity[dst]  = self.quantity[src]
+        self.side[dst]      = self.side[src]
+        self.timestamp[dst] = self.timestamp[src]
+
+    def _swap(self, a: int, b: int) -> None:
+        self.ts[a], self.ts[b] = self.ts[b], self.ts[a]
+        self.seq[a], self.seq[b] = self.seq[b], self.seq[a]
+        self.order_id[a], self.order_id[b] = self.order_id[b], self.order_id[a]
+        self.price[a], self.price[b] = self.price[b], self.price[a]
+        self.quantity[a], self.quantity[b] = self.quantity[b], self.quantity[a]
+        self.side[a], self.side[b] = self.side[b], self.side[a]
+        self.timestamp[a], self.timestamp[b] = self.timestamp[b], self.timestamp[a]
+
+    def _sift_up(self, i: int) -> None:
+        while i > 0:
+            parent = (i - 1) >> 1
+            if not self._less(i, parent):
+                break
+            self._swap(i, parent)
+            i = parent
+
+    def _sift_down(self, i: int) -> None:
+        n = self.size
+        while True:
+            child = 2 * i + 1
+            if child >= n:
+                break
+            if child + 1 < n and self._less(child + 1, child):
+                child += 1
+            if not self._less(child, i):
+                break
+            self._swap(i, child)
+            i = child
+
+    def _grow(self) -> None:
+        cap = 2 * self.ts.shape[0]
+        n = self.size
+        ts = np.empty(cap, dtype=np.int64)
+        ts[:n] = self.ts[:n]
+        self.ts = ts
+        seq = np.empty(cap, dtype=np.int64)
+        seq[:n] = self.seq[:n]
+        self.seq = seq
+        order_id = np.empty(cap, dtype=np.int64)
+        order_id[:n] = self.order_id[:n]
+        self.order_id = order_id
+        price = np.empty(cap, dtype=np.int64)
+        price[:n] = self.price[:n]
+        self.price = price
+        quantity = np.empty(cap, dtype=np.int64)
+        quantity[:n] = self.quantity[:n]
+        self.quantity = quantity
+        side = np.empty(cap, dtype=np.int64)
+        side[:n] = self.side[:n]
+        self.side = side
+        timestamp = np.empty(cap, dtype=np.int64)
+        timestamp[:n] = self.timestamp[:n]
+        self.timestamp = timestamp
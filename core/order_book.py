@@ -1,181 +1,691 @@
 """
 Limit‑order book engine (Numba‑accelerated prototype).
 
-Book depth is fixed (MAX_LEVELS).  Each side (bids / asks) is represented by two
-parallel NumPy arrays:
+Book depth is fixed (MAX_LEVELS).  Each side (bids / asks) is represented by three
+parallel NumPy arrays holding one slot per *price level*:
 
     prices[0:MAX_LEVELS]
-    qtys[0:MAX_LEVELS]
+    qtys[0:MAX_LEVELS]      (aggregate resting qty at that price, int32)
+    firsts[0:MAX_LEVELS]    (oldest resting order at that price, -1 if none)
 
-Additionally   order_id → (side, index)   매핑을 numba.typed.Dict 로 유지하여
-빠른 cancel 처리를 지원한다.
+Orders joining an existing level only bump its quantity and join the back of
+its queue; the arrays are shifted only when a brand-new price level is opened.
+
+The live part of each side starts at `heads[side]` (_BID = 0, _ASK = 1) rather
+than at slot 0.  A drained top level is retired by bumping the head — no
+memmove — and the freed front slots are reused by later inserts.  Retired
+slots hold a sentinel that sorts ahead of every real price (+INF_PRICE for
+bids, -INF_PRICE for asks) so `_find_pos` never lands in front of the head.
+
+Levels cancelled down to zero deeper in the book are left as tombstones
+(qty 0, price kept): the head skips over them when it gets there, and they
+are only compacted out when a side runs out of slots.
+
+The individual orders live in a fixed-size pool (`orders`, SoA columns):
+each level's orders form a circular doubly-linked list through the pool in
+arrival order, so fills consume them FIFO and a cancel unlinks exactly the
+order's remaining quantity.  Filled and cancelled orders go back on the
+pool's free list.
+
+Additionally   order_id → pool slot   매핑을 open-addressing hash table
+(NumPy 배열 2개, Fibonacci hashing + linear probing) 로 유지하여 빠른 cancel
+처리를 지원한다.  Pool slot 에 price 가 있어 shift 이후에도 level 을 찾는다.
+
+Executions are written into a preallocated `trade_dtype` record buffer
+(`trades`) with a 1-element cursor array (`trades_idx`) — no per-trade
+allocation.
 
 Public API
 ----------
-init_book()                       → tuple(bids_p, bids_q, asks_p, asks_q, idx_map)
-add_limit(order, …)               → None
-process_market(order, …, trades)  → None
-cancel(order_id, …)               → bool
-match_incoming(order, …, trades)  → None   (내부에서 호출)
+init_book(max_orders)                                     → tuple(bids_p, bids_q, bids_o, asks_p, asks_q, asks_o, heads, idx_map, orders)
+init_books(max_orders[:])                                 → one book per entry, sized independently
+book_view(books, s)                                       → book `s` of `init_books`, as `init_book` returns it
+init_trades(max_orders)                                   → tuple(trades, trades_idx)
+top_of_book(bids_p, bids_q, asks_p, asks_q, heads)        → tuple(bid_px, bid_qty, ask_px, ask_qty)
+add_limit(order, …)                                       → None
+cancel(order_id, …)                                       → bool
+match_incoming(order, …, trades, trades_idx, limit_price) → None   (내부에서 호출)
+
+`…` is the book tuple returned by `init_book`, unpacked in order.
 """
 
 import numpy as np
-from numba import njit, int64, float64
-from numba.typed import Dict
+from numba import njit
 from core.datatypes import (
     Order,
-    Trade,
+    trade_dtype,
     ORDER_SIDE_BUY,
-    ORDER_SIDE_SELL,
 )
 
 # ──────────────────────────────────────────────────────────────────────────
 MAX_LEVELS: int = 200      # book depth
-INF_PRICE: float = 1e18
+INF_PRICE: int = np.iinfo(np.int64).max   # ticks
+QTY_MAX: int = np.iinfo(np.int32).max     # book quantities are int32
+_LINEAR_WINDOW: int = 8    # int64 per 64-byte cache line (_find_pos)
+
+# heads[] index per side
+_BID: int = 0
+_ASK: int = 1
+
+_NO_ORDER: int = -1        # empty queue / end of free list / empty index slot
+_FIB_MULT = np.uint64(0x9E3779B97F4A7C15)  # 2**64 / golden ratio
+
+
+@njit(cache=True)
+def _move_right(arr, lo: int, hi: int):
+    """
+    arr[lo+1:hi] ← arr[lo:hi-1]  (overlapping, copied back to front).
+
+    Written against views with a non-negative loop index: indexing `arr`
+    with `j - 1` directly makes Numba emit negative-index wraparound checks,
+    which keeps LLVM from vectorising the copy.
+    """
+    src = arr[lo:hi - 1]
+    dst = arr[lo + 1:hi]
+    for k in range(hi - lo - 2, -1, -1):
+        dst[k] = src[k]
+
+
+@njit(cache=True)
+def _move_left(arr, lo: int, hi: int):
+    """
+    arr[lo-1:hi-1] ← arr[lo:hi]  (overlapping, copied front to back).
+    """
+    src = arr[lo:hi]
+    dst = arr[lo - 1:hi - 1]
+    for k in range(hi - lo):
+        dst[k] = src[k]
+
+
+@njit(cache=True)
+def _shift_down(prices, qtys, firsts, start: int):
+    """
+    Shift [start..MAX_LEVELS-2] down by one to make room at `start`.
+
+    One pass per array: each is a plain memmove-shaped loop that LLVM
+    vectorises, unlike an interleaved multi-array loop.
+    """
+    _move_right(prices, start, MAX_LEVELS)
+    _move_right(qtys, start, MAX_LEVELS)
+    _move_right(firsts, start, MAX_LEVELS)
+
+
+@njit(cache=True)
+def _empty_price(side: int) -> int:
+    """Price held by never-used slots at the tail of `side`."""
+    return -1 if side == _BID else INF_PRICE
 
 
 @njit(cache=True)
-def _shift_down(prices, qtys, start: int):
+def _pop_level(prices, qtys, heads, side: int):
     """
-    Shift [0..start-1] down by one to make room at `start`.
+    Retire the (drained) top level of `side` by advancing its head, along
+    with any cancelled-out levels (tombstones) right behind it, so the head
+    always points at a live level or at an empty side.
+
+    Only empty levels are retired, so their queues (`firsts`) are already
+    empty and need no update.
     """
-    for j in range(MAX_LEVELS - 1, start, -1):
-        prices[j] = prices[j - 1]
-        qtys[j] = qtys[j - 1]
+    retired = INF_PRICE if side == _BID else -INF_PRICE
+    empty = _empty_price(side)
+    h = heads[side]
+    while True:
+        prices[h] = retired
+        qtys[h] = 0
+        h += 1
+        if h == MAX_LEVELS:
+            # whole side retired → back to an empty book
+            prices[:] = empty
+            h = 0
+            break
+        if qtys[h] != 0 or prices[h] == empty:
+            break
+    heads[side] = h
 
 
 @njit(cache=True)
-def _shift_up(prices, qtys):
+def _compact(prices, qtys, firsts, heads, side: int):
     """
-    Remove level 0 and shift up.
+    Squeeze tombstones out of `side` and move it back to slot 0.
     """
-    for i in range(MAX_LEVELS - 1):
-        prices[i] = prices[i + 1]
-        qtys[i] = qtys[i + 1]
-    # reset last slot
-    prices[MAX_LEVELS - 1] = -1.0
-    qtys[MAX_LEVELS - 1] = 0
+    w = 0
+    for r in range(heads[side], MAX_LEVELS):
+        if qtys[r] != 0:
+            prices[w] = prices[r]
+            qtys[w] = qtys[r]
+            firsts[w] = firsts[r]
+            w += 1
+    prices[w:] = _empty_price(side)
+    qtys[w:] = 0
+    firsts[w:] = _NO_ORDER
+    heads[side] = 0
 
 
 @njit(cache=True)
-def init_book():
+def _open_level(prices, qtys, firsts, heads, side: int, pos: int,
+                price: int, qty: int, idx_map, orders) -> int:
     """
+    Open a new, empty-queued level at `pos`.
+
+    If retired slots are available in front of the head and that is the
+    shorter move (or the side is full), the levels ahead of `pos` slide up
+    into them — prepending costs nothing.  Otherwise the tail is shifted
+    down, and a full side drops its worst level along with the orders
+    queued on it.  Tombstones are only compacted away once the side is
+    full.
+
     Returns
     -------
-    bids_p, bids_q, asks_p, asks_q : np.ndarray
-    idx_map : numba.typed.Dict[int64, int64]
-        order_id → signed index
-        +idx  => bid side, index = idx - 1
-        -idx  => ask side, index = -idx - 1
+    int : slot of the new level, or -1 if the book is full
     """
-    bids_p = np.full(MAX_LEVELS, -1.0)      # descending
-    bids_q = np.zeros(MAX_LEVELS, dtype=np.int64)
+    if heads[side] == 0 and prices[MAX_LEVELS - 1] != _empty_price(side):
+        _compact(prices, qtys, firsts, heads, side)
+        pos = _find_pos(prices, price, side == _BID)
+    h = heads[side]
+    if h > 0 and (qtys[MAX_LEVELS - 1] != 0 or pos - h < MAX_LEVELS - pos):
+        _move_left(prices, h, pos)
+        _move_left(qtys, h, pos)
+        _move_left(firsts, h, pos)
+        heads[side] = h - 1
+        pos -= 1
+    elif pos >= MAX_LEVELS:
+        return -1
+    else:
+        if qtys[MAX_LEVELS - 1] != 0:
+            _evict_queue(firsts, MAX_LEVELS - 1, idx_map, orders)
+        _shift_down(prices, qtys, firsts, pos)
+    prices[pos] = price
+    qtys[pos] = qty
+    firsts[pos] = _NO_ORDER
+    return pos
 
-    asks_p = np.full(MAX_LEVELS, INF_PRICE)  # ascending
-    asks_q = np.zeros(MAX_LEVELS, dtype=np.int64)
 
-    idx_map = Dict.empty(int64, int64)
-    return bids_p, bids_q, asks_p, asks_q, idx_map
+@njit(cache=True)
+def init_book(max_orders: int = 1 << 16):
+    """
+    Parameters
+    ----------
+    max_orders : int
+        Upper bound on the number of orders resting in the book at the same
+        time (filled and cancelled orders free their slot).  Sizes the order
+        pool and index, which never grow; `add_limit` raises ValueError once
+        the pool is exhausted.
+
+    Returns
+    -------
+    bids_p, bids_q, bids_o, asks_p, asks_q, asks_o : np.ndarray
+        Per-level price, aggregate quantity and oldest queued order (pool
+        slot, -1 if none).
+    heads : np.ndarray[int64] of length 2
+        First live slot of the bid / ask side.
+    idx_map : tuple(keys, slots)
+        Open-addressed table  order_id → pool slot; a slot of -1 marks an
+        empty entry, so every int64 is a valid order_id.
+    orders : tuple(ord_id, ord_price, ord_qty, ord_side, ord_next, ord_prev, free)
+        Order pool; `ord_next` / `ord_prev` link each level's queue, and
+        `free[0]` heads the free list (threaded through `ord_next`).
+    """
+    return book_view(init_books(np.full(1, max_orders, dtype=np.int64)), 0)
+
+
+@njit(cache=True)
+def init_books(max_orders):
+    """
+    One independent book per entry of `max_orders` (e.g. one per symbol),
+    stored side by side.
+
+    The per-level arrays get a leading book axis.  The order index and pool
+    are flat instead: book `s` owns a region of each sized from its own
+    `max_orders[s]`, so one busy book does not inflate every other book's
+    tables.
+
+    Returns
+    -------
+    bids_p, bids_q, bids_o, asks_p, asks_q, asks_o, heads : np.ndarray
+        As in `init_book`, with a leading axis of length n_books.
+    idx_map, orders : tuple
+        As in `init_book`, flat; `free` holds one entry per book.
+    ht_offsets, pool_offsets : np.ndarray[int64] of length n_books + 1
+        Book `s` owns idx_map rows [ht_offsets[s], ht_offsets[s+1]) and
+        pool rows [pool_offsets[s], pool_offsets[s+1]).
+    """
+    n_books = max_orders.shape[0]
+    bids_p = np.full((n_books, MAX_LEVELS), -1, dtype=np.int64)         # descending
+    bids_q = np.zeros((n_books, MAX_LEVELS), dtype=np.int32)
+    bids_o = np.full((n_books, MAX_LEVELS), _NO_ORDER, dtype=np.int64)
+
+    asks_p = np.full((n_books, MAX_LEVELS), INF_PRICE, dtype=np.int64)  # ascending
+    asks_q = np.zeros((n_books, MAX_LEVELS), dtype=np.int32)
+    asks_o = np.full((n_books, MAX_LEVELS), _NO_ORDER, dtype=np.int64)
+
+    heads = np.zeros((n_books, 2), dtype=np.int64)
+
+    ht_offsets = np.zeros(n_books + 1, dtype=np.int64)
+    pool_offsets = np.zeros(n_books + 1, dtype=np.int64)
+    for s in range(n_books):
+        cap = max(max_orders[s], 1)
+        # power of two, load factor ≤ 0.5
+        n = 1
+        while n < 2 * cap:
+            n <<= 1
+        ht_offsets[s + 1] = ht_offsets[s] + n
+        pool_offsets[s + 1] = pool_offsets[s] + cap
+
+    idx_map = (
+        np.empty(ht_offsets[n_books], dtype=np.int64),
+        np.full(ht_offsets[n_books], _NO_ORDER, dtype=np.int64),
+    )
+
+    # every slot starts on its book's free list: 0 → 1 → … → cap-1
+    # (slots are local to the book's region)
+    n_slots = pool_offsets[n_books]
+    ord_next = np.empty(n_slots, dtype=np.int64)
+    for s in range(n_books):
+        lo = pool_offsets[s]
+        hi = pool_offsets[s + 1]
+        for i in range(hi - lo):
+            ord_next[lo + i] = i + 1
+        ord_next[hi - 1] = _NO_ORDER
+    orders = (
+        np.empty(n_slots, dtype=np.int64),    # order_id
+        np.empty(n_slots, dtype=np.int64),    # price
+        np.empty(n_slots, dtype=np.int32),    # remaining qty
+        np.empty(n_slots, dtype=np.int64),    # side
+        ord_next,
+        np.empty(n_slots, dtype=np.int64),    # ord_prev
+        np.zeros(n_books, dtype=np.int64),    # free
+    )
+    return (bids_p, bids_q, bids_o, asks_p, asks_q, asks_o, heads, idx_map,
+            orders, ht_offsets, pool_offsets)
+
+
+@njit(cache=True)
+def book_view(books, s: int):
+    """
+    Book `s` of `init_books`, as the tuple `init_book` returns (views, no
+    copy).
+    """
+    (bids_p, bids_q, bids_o, asks_p, asks_q, asks_o, heads, idx_map, orders,
+     ht_offsets, pool_offsets) = books
+    keys, slots = idx_map
+    ord_id, ord_price, ord_qty, ord_side, ord_next, ord_prev, free = orders
+    klo = ht_offsets[s]
+    khi = ht_offsets[s + 1]
+    lo = pool_offsets[s]
+    hi = pool_offsets[s + 1]
+    return (bids_p[s], bids_q[s], bids_o[s], asks_p[s], asks_q[s], asks_o[s],
+            heads[s], (keys[klo:khi], slots[klo:khi]),
+            (ord_id[lo:hi], ord_price[lo:hi], ord_qty[lo:hi], ord_side[lo:hi],
+             ord_next[lo:hi], ord_prev[lo:hi], free[s:s + 1]))
+
+
+# ──────────────────────────── order index ────────────────────────────────
+@njit(cache=True)
+def _ht_home(key: int, mask: int) -> int:
+    """Fibonacci hash of `key` into a table of size mask + 1."""
+    return np.int64((np.uint64(key) * _FIB_MULT) >> np.uint64(32)) & mask
+
+
+@njit(cache=True)
+def _ht_slot(idx_map, key: int) -> int:
+    """
+    Slot holding `key`, or the empty slot where it would go.
+
+    The probe visits each slot at most once; -1 means the table is full and
+    `key` is not in it.
+    """
+    keys, slots = idx_map
+    mask = keys.shape[0] - 1
+    i = _ht_home(key, mask)
+    for _ in range(keys.shape[0]):
+        if slots[i] == _NO_ORDER or keys[i] == key:
+            return i
+        i = (i + 1) & mask
+    return -1
+
+
+@njit(cache=True)
+def _ht_put(idx_map, key: int, slot: int):
+    keys, slots = idx_map
+    i = _ht_slot(idx_map, key)
+    if i < 0:
+        raise ValueError("order index full: init_book max_orders too small")
+    keys[i] = key
+    slots[i] = slot
+
+
+@njit(cache=True)
+def _ht_pop(idx_map, key: int):
+    """
+    Remove `key`.
+
+    Returns
+    -------
+    (found, slot)
+    """
+    keys, slots = idx_map
+    i = _ht_slot(idx_map, key)
+    if i < 0 or slots[i] == _NO_ORDER:
+        return False, _NO_ORDER
+    slot = slots[i]
+
+    # backward-shift deletion: pull later probe-chain members into the
+    # hole so lookups never need tombstones
+    mask = keys.shape[0] - 1
+    j = i
+    while True:
+        j = (j + 1) & mask
+        if slots[j] == _NO_ORDER:
+            break
+        home = _ht_home(keys[j], mask)
+        if ((j - home) & mask) >= ((j - i) & mask):
+            keys[i] = keys[j]
+            slots[i] = slots[j]
+            i = j
+    slots[i] = _NO_ORDER
+    return True, slot
+
+
+# ──────────────────────────── order queues ───────────────────────────────
+@njit(cache=True)
+def _alloc_order(orders, order_id: int, price: int, qty: int,
+                 side: int) -> int:
+    """Take a slot off the pool's free list and fill it in."""
+    ord_id, ord_price, ord_qty, ord_side, ord_next, ord_prev, free = orders
+    s = free[0]
+    if s == _NO_ORDER:
+        raise ValueError("order pool full: init_book max_orders too small")
+    free[0] = ord_next[s]
+    ord_id[s] = order_id
+    ord_price[s] = price
+    ord_qty[s] = qty
+    ord_side[s] = side
+    return s
+
+
+@njit(cache=True)
+def _free_order(orders, s: int):
+    """Put pool slot `s` back on the free list."""
+    ord_next = orders[4]
+    free = orders[6]
+    ord_next[s] = free[0]
+    free[0] = s
+
+
+@njit(cache=True)
+def _enqueue(firsts, pos: int, orders, s: int):
+    """Append pool slot `s` to the back of level `pos`'s queue."""
+    ord_next = orders[4]
+    ord_prev = orders[5]
+    f = firsts[pos]
+    if f == _NO_ORDER:
+        firsts[pos] = s
+        ord_next[s] = s
+        ord_prev[s] = s
+    else:
+        last = ord_prev[f]
+        ord_next[last] = s
+        ord_prev[s] = last
+        ord_next[s] = f
+        ord_prev[f] = s
+
+
+@njit(cache=True)
+def _unlink(firsts, pos: int, orders, s: int):
+    """Remove pool slot `s` from level `pos`'s queue."""
+    ord_next = orders[4]
+    ord_prev = orders[5]
+    n = ord_next[s]
+    if n == s:
+        firsts[pos] = _NO_ORDER
+    else:
+        p = ord_prev[s]
+        ord_next[p] = n
+        ord_prev[n] = p
+        if firsts[pos] == s:
+            firsts[pos] = n
+
+
+@njit(cache=True)
+def _evict_queue(firsts, pos: int, idx_map, orders):
+    """Forget every order queued on level `pos` (the level is being dropped)."""
+    ord_id = orders[0]
+    ord_next = orders[4]
+    s = firsts[pos]
+    while s != _NO_ORDER:
+        n = ord_next[s]
+        if n == firsts[pos]:
+            n = _NO_ORDER
+        _ht_pop(idx_map, ord_id[s])
+        _free_order(orders, s)
+        s = n
+    firsts[pos] = _NO_ORDER
+
+
+@njit(cache=True)
+def _find_pos(prices, price: int, is_bid: bool) -> int:
+    """
+    Number of levels strictly better than `price`, i.e. the slot where
+    `price` lives or would be inserted.
+
+    Branch-free binary search narrows the window down to one cache line
+    (_LINEAR_WINDOW doubles), which is then finished with a branch-free
+    linear count — cheaper than the last few dependent binary probes.
+    """
+    base = 0
+    n = MAX_LEVELS
+    pos = 0
+    if is_bid:
+        while n > _LINEAR_WINDOW:
+            half = n >> 1
+            base += (prices[base + half - 1] > price) * half
+            n -= half
+        for i in range(base, base + n):
+            pos += prices[i] > price
+    else:
+        while n > _LINEAR_WINDOW:
+            half = n >> 1
+            base += (prices[base + half - 1] < price) * half
+            n -= half
+        for i in range(base, base + n):
+            pos += prices[i] < price
+    return base + pos
+
+
+def init_trades(max_orders: int = 1 << 16):
+    """
+    Allocate the execution buffer once for the whole run.
+
+    Every execution either completes the incoming order or fills a resting
+    order, and each order rests at most once, so `max_orders` orders can
+    never produce more than 2 * max_orders trades — the buffer never needs
+    to grow.
+
+    Returns
+    -------
+    trades : np.ndarray[trade_dtype]
+        Preallocated execution buffer.
+    trades_idx : np.ndarray[int64] of length 1
+        Number of rows written so far.
+    """
+    trades = np.empty(2 * max(max_orders, 1), dtype=trade_dtype)
+    trades_idx = np.zeros(1, dtype=np.int64)
+    return trades, trades_idx
+
+
+@njit(cache=True)
+def _record_trade(trades, trades_idx, maker_order_id: int,
+                  taker_order_id: int, price: int, quantity: int,
+                  timestamp: int):
+    i = trades_idx[0]
+    rec = trades[i]
+    rec.maker_order_id = maker_order_id
+    rec.taker_order_id = taker_order_id
+    rec.price = price
+    rec.quantity = quantity
+    rec.timestamp = timestamp
+    trades_idx[0] = i + 1
 
 
 # ──────────────────────────────────────────────────────────────────────────
 @njit(cache=True)
-def add_limit(order: Order, bids_p, bids_q, asks_p, asks_q, idx_map):
+def _rest(prices, qtys, firsts, heads, side: int, order: Order, idx_map,
+          orders):
+    """
+    Queue `order` on its price level of `side`, opening the level first if
+    it is not quoted yet.
+    """
+    price = order.price
+    pos = _find_pos(prices, price, side == _BID)
+    quoted = pos < MAX_LEVELS and prices[pos] == price
+    if quoted and qtys[pos] + order.quantity > QTY_MAX:
+        raise ValueError("price level total would exceed QTY_MAX")
+    s = _alloc_order(orders, order.order_id, price, order.quantity,
+                     order.side)
+    if quoted:
+        qtys[pos] += order.quantity
+    else:
+        pos = _open_level(prices, qtys, firsts, heads, side, pos,
+                          price, order.quantity, idx_map, orders)
+        if pos < 0:
+            _free_order(orders, s)
+            return  # book full, drop
+    _enqueue(firsts, pos, orders, s)
+    _ht_put(idx_map, order.order_id, s)
+
+
+@njit(cache=True)
+def add_limit(order: Order, bids_p, bids_q, bids_o, asks_p, asks_q, asks_o,
+              heads, idx_map, orders):
     """
     Insert a limit order.  If it can immediately match (crossing),
     `match_incoming` will be invoked inside the caller.
+
+    An order at an already-listed price is merged into that level (and
+    queued behind the orders already there) without touching the rest of
+    the book.  Quantities must fit in int32 (QTY_MAX): an order above it, or
+    one that would push its level's total above it, raises ValueError and
+    leaves the book untouched.
     """
+    if order.quantity > QTY_MAX:
+        raise ValueError("order quantity exceeds the int32 book limit QTY_MAX")
     if order.side == ORDER_SIDE_BUY:
-        # find insertion point (prices descending)
-        pos = 0
-        while pos < MAX_LEVELS and order.price <= bids_p[pos]:
-            pos += 1
-        if pos >= MAX_LEVELS:
-            return  # book full, drop
-        _shift_down(bids_p, bids_q, pos)
-        bids_p[pos] = order.price
-        bids_q[pos] = order.quantity
-        idx_map[order.order_id] = pos + 1  # + sign for bid
+        _rest(bids_p, bids_q, bids_o, heads, _BID, order, idx_map, orders)
     else:
-        pos = 0
-        while pos < MAX_LEVELS and order.price >= asks_p[pos]:
-            pos += 1
-        if pos >= MAX_LEVELS:
-            return
-        _shift_down(asks_p, asks_q, pos)
-        asks_p[pos] = order.price
-        asks_q[pos] = order.quantity
-        idx_map[order.order_id] = -(pos + 1)  # − sign for ask
+        _rest(asks_p, asks_q, asks_o, heads, _ASK, order, idx_map, orders)
 
 
 @njit(cache=True)
-def _best_bid(bids_p, bids_q):
-    return bids_p[0], bids_q[0]
+def top_of_book(bids_p, bids_q, asks_p, asks_q, heads):
+    """
+    Best bid / ask and their aggregate quantities in O(1).
+
+    The head of each side is always a live level (drained levels and
+    tombstones are retired as they reach the top), so this is two indexed
+    loads per side — no search.  An empty side reports qty 0 with price -1
+    (bids) or INF_PRICE (asks).
+
+    Returns
+    -------
+    (bid_price, bid_qty, ask_price, ask_qty)
+    """
+    hb = heads[_BID]
+    ha = heads[_ASK]
+    return bids_p[hb], bids_q[hb], asks_p[ha], asks_q[ha]
 
 
 @njit(cache=True)
-def _best_ask(asks_p, asks_q):
-    return asks_p[0], asks_q[0]
+def _remove_order(prices, qtys, firsts, heads, side: int, orders, s: int):
+    """
+    Take pool slot `s` off its level.  A level left empty stays in place as
+    a tombstone, unless it is the top of the side, which is retired.
+    """
+    pos = _find_pos(prices, orders[1][s], side == _BID)
+    qtys[pos] -= orders[2][s]
+    _unlink(firsts, pos, orders, s)
+    if qtys[pos] == 0 and pos == heads[side]:
+        _pop_level(prices, qtys, heads, side)
 
 
 @njit(cache=True)
-def cancel(order_id: int, bids_q, asks_q, idx_map) -> bool:
+def cancel(order_id: int, bids_p, bids_q, bids_o, asks_p, asks_q, asks_o,
+           heads, idx_map, orders) -> bool:
     """
     Cancel an existing resting order.
 
+    Only the order's remaining (unfilled) quantity is taken off its level.
+    A level cancelled down to zero stays in place as a tombstone, unless it
+    is the top of the book, in which case it is retired right away.
+
     Returns
     -------
     bool : True if found & removed
     """
-    if order_id in idx_map:
-        idx = idx_map.pop(order_id)
-        if idx > 0:          # bid
-            bids_q[idx - 1] = 0
-        else:                # ask
-            asks_q[-idx - 1] = 0
-        return True
-    return False
+    found, s = _ht_pop(idx_map, order_id)
+    if not found:
+        return False
+    if orders[3][s] == ORDER_SIDE_BUY:
+        _remove_order(bids_p, bids_q, bids_o, heads, _BID, orders, s)
+    else:
+        _remove_order(asks_p, asks_q, asks_o, heads, _ASK, orders, s)
+    _free_order(orders, s)
+    return True
 
 
 @njit(cache=True)
-def match_incoming(order: Order, bids_p, bids_q, asks_p, asks_q, trades):
+def _min_i64(a: int, b: int) -> int:
+    """Branch-free min for int64."""
+    return b + ((a - b) & -np.int64(a < b))
+
+
+@njit(cache=True)
+def _fill_top(prices, qtys, firsts, heads, side: int, order: Order, idx_map,
+              orders, trades, trades_idx):
     """
-    Core price-time priority matching loop.
+    Trade `order` against the oldest order on the top level of `side`.  A
+    fully filled maker leaves the book and the order index; a drained
+    level is retired.
     """
-    if order.side == ORDER_SIDE_BUY:
-        # match vs asks
-        while order.quantity > 0:
-            best_price, best_qty = _best_ask(asks_p, asks_q)
-            if best_qty == 0 or order.price < best_price:
-                break
-            traded_qty = min(order.quantity, best_qty)
-            trades.append(
-                Trade(-1, order.order_id, best_price, traded_qty, order.timestamp)
-            )
-            order.quantity -= traded_qty
-            asks_q[0] -= traded_qty
-            if asks_q[0] == 0:
-                _shift_up(asks_p, asks_q)
-    else:
-        # match vs bids
-        while order.quantity > 0:
-            best_price, best_qty = _best_bid(bids_p, bids_q)
-            if best_qty == 0 or order.price > best_price:
-                break
-            traded_qty = min(order.quantity, best_qty)
-            trades.append(
-                Trade(-1, order.order_id, best_price, traded_qty, order.timestamp)
-            )
-            order.quantity -= traded_qty
-            bids_q[0] -= traded_qty
-            if bids_q[0] == 0:
-                _shift_up(bids_p, bids_q)
+    ord_id = orders[0]
+    ord_qty = orders[2]
+    h = heads[side]
+    s = firsts[h]
+    traded_qty = _min_i64(order.quantity, ord_qty[s])
+    _record_trade(trades, trades_idx, ord_id[s], order.order_id, prices[h],
+                  traded_qty, order.timestamp)
+    order.quantity -= traded_qty
+    qtys[h] -= traded_qty
+    ord_qty[s] -= traded_qty
+    if ord_qty[s] == 0:
+        _unlink(firsts, h, orders, s)
+        _ht_pop(idx_map, ord_id[s])
+        _free_order(orders, s)
+    if qtys[h] == 0:
+        _pop_level(prices, qtys, heads, side)
 
 
 @njit(cache=True)
-def process_market(order: Order, bids_p, bids_q, asks_p, asks_q, trades):
+def match_incoming(order: Order, bids_p, bids_q, bids_o, asks_p, asks_q,
+                   asks_o, heads, idx_map, orders, trades, trades_idx,
+                   limit_price: int):
     """
-    Process a pure market order (price ignored).
+    Core price-time priority matching loop.
+
+    Matches up to `limit_price` — the order's own price for a limit order,
+    +INF_PRICE / -INF_PRICE for a market buy / sell.  Within a level the resting orders are filled oldest first, one trade
+    per maker.  Both directions share one loop: the opposite side is picked
+    once by index (sell → bids, buy → asks) and the cross test is folded
+    into the order's sign.
     """
-    order.price = INF_PRICE if order.side == ORDER_SIDE_BUY else -INF_PRICE
-    match_incoming(order, bids_p, bids_q, asks_p, asks_q, trades)
+    sign = order.side
+    opp = (sign + 1) >> 1           # _BID for a sell, _ASK for a buy
+    book_p = (bids_p, asks_p)[opp]
+    book_q = (bids_q, asks_q)[opp]
+    book_o = (bids_o, asks_o)[opp]
+    while order.quantity > 0:
+        h = heads[opp]
+        if book_q[h] == 0 or sign * limit_price < sign * book_p[h]:
+            break
+        _fill_top(book_p, book_q, book_o, heads, opp, order, idx_map,
+                  orders, trades, trades_idx)
+
@@ -14,79 +14,282 @@ $ python simulator.py
 
 from __future__ import annotations
 
-from typing import Iterable, List, Tuple, Optional
+from typing import Iterable, List, Sequence, Tuple, Optional
 
-from numba.typed import List  # typed list for Numba
+import numpy as np
+from numba import njit, prange
 
-from core.datatypes import Order, Trade, ORDER_SIDE_BUY, ORDER_SIDE_SELL
-from core.event_queue import EventQueue
+from core.datatypes import (
+    Order,
+    ORDER_SIDE_BUY,
+    ORDER_SIDE_SELL,
+    price_to_ticks,
+    ticks_to_price,
+)
+from core.event_queue import EventHeap
 from core.order_book import (
     init_book,
+    init_books,
+    book_view,
+    init_trades,
     add_limit,
     match_incoming,
-    process_market,
+    INF_PRICE,
 )
 
 TIMESTAMP = int
 Event = Order  # for now the only event type we handle
 
+_EVENT_CHUNK = 4096  # events popped per EventHeap.pop_due call
+_LAST_TS: TIMESTAMP = np.iinfo(np.int64).max  # pop_due bound: everything
+
 
 # ──────────────────────────────────────────────────────────────────────────
+@njit(cache=True)
+def _on_order(ev, bids_p, bids_q, bids_o, asks_p, asks_q, asks_o, heads,
+              idx_map, orders, trades, trades_idx):
+    """
+    Route one incoming order through the book.
+    """
+    # treat price==0 as a pure market order: sweep with an unbounded limit
+    is_market = ev.price == 0
+    limit = INF_PRICE * ev.side if is_market else ev.price
+    match_incoming(ev, bids_p, bids_q, bids_o, asks_p, asks_q, asks_o, heads,
+                   idx_map, orders, trades, trades_idx, limit)
+    if ev.quantity > 0 and not is_market:
+        add_limit(ev, bids_p, bids_q, bids_o, asks_p, asks_q, asks_o, heads,
+                  idx_map, orders)
+
+
+@njit(cache=True)
+def _drive(ev_oid, ev_price, ev_qty, ev_side, ev_ts,
+           bids_p, bids_q, bids_o, asks_p, asks_q, asks_o, heads, idx_map,
+           orders, trades, trades_idx) -> int:
+    """
+    Replay time-sorted SoA event columns against one book, entirely inside
+    Numba.  Returns the number of trades written.
+    """
+    for i in range(ev_oid.shape[0]):
+        ev = Order(ev_oid[i], ev_price[i], ev_qty[i], ev_side[i], ev_ts[i])
+        _on_order(ev, bids_p, bids_q, bids_o, asks_p, asks_q, asks_o, heads,
+                  idx_map, orders, trades, trades_idx)
+    return trades_idx[0]
+
+
+@njit(cache=True)
+def _try_drive(ev_oid, ev_price, ev_qty, ev_side, ev_ts,
+               bids_p, bids_q, bids_o, asks_p, asks_q, asks_o, heads,
+               idx_map, orders, trades, trades_idx) -> bool:
+    """
+    `_drive`, reporting a rejected order (e.g. ValueError from `add_limit`)
+    as False instead of raising.
+
+    An exception cannot leave a prange body, and a try block inside the
+    loop would stop it from being parallelised, so `_drive_batch` goes
+    through this wrapper.
+    """
+    try:
+        _drive(ev_oid, ev_price, ev_qty, ev_side, ev_ts,
+               bids_p, bids_q, bids_o, asks_p, asks_q, asks_o, heads,
+               idx_map, orders, trades, trades_idx)
+    except Exception:
+        return False
+    return True
+
+
+def _pack_events(events_per_symbol):
+    """
+    Sort each symbol's events by timestamp (stable → FIFO on ties) and pack
+    them into flat SoA columns.
+
+    Returns
+    -------
+    offsets : np.ndarray[int64]
+        Symbol `s` owns rows [offsets[s], offsets[s+1]).
+    columns : tuple(order_id, price, quantity, side, timestamp)
+    """
+    per_symbol = [
+        sorted(events, key=lambda item: item[0])
+        for events in events_per_symbol
+    ]
+    offsets = np.zeros(len(per_symbol) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(evs) for evs in per_symbol])
+    n_events = int(offsets[-1])
+
+    ev_oid = np.empty(n_events, dtype=np.int64)
+    ev_price = np.empty(n_events, dtype=np.int64)
+    ev_qty = np.empty(n_events, dtype=np.int64)
+    ev_side = np.empty(n_events, dtype=np.int64)
+    ev_ts = np.empty(n_events, dtype=np.int64)
+    i = 0
+    for evs in per_symbol:
+        for _, ev in evs:
+            ev_oid[i] = ev.order_id
+            ev_price[i] = ev.price
+            ev_qty[i] = ev.quantity
+            ev_side[i] = ev.side
+            ev_ts[i] = ev.timestamp
+            i += 1
+    return offsets, (ev_oid, ev_price, ev_qty, ev_side, ev_ts)
+
+
+def _event_columns(events):
+    """
+    (ts, order_id, price, quantity, side, timestamp) columns of the
+    (ts, Order) pairs, laid out as `EventHeap.push_many` takes them.
+    """
+    return (
+        np.array([ts for ts, _ in events], dtype=np.int64),
+        np.array([ev.order_id for _, ev in events], dtype=np.int64),
+        np.array([ev.price for _, ev in events], dtype=np.int64),
+        np.array([ev.quantity for _, ev in events], dtype=np.int64),
+        np.array([ev.side for _, ev in events], dtype=np.int64),
+        np.array([ev.timestamp for _, ev in events], dtype=np.int64),
+    )
+
+
 def run_simulation(
     events: Iterable[Tuple[TIMESTAMP, Event]],
     *,
     strategy: Optional[object] = None,
-) -> List[Trade]:
+) -> np.ndarray:
     """
-    Drive the event queue until empty and return the list of Trade executions.
+    Drive the events in time order and return the executions as a
+    `trade_dtype` record array.  Order and trade prices are integer ticks;
+    convert with `price_to_ticks` / `ticks_to_price` at the edges.
+
+    Without a strategy callback the events are packed into NumPy columns
+    once and the whole loop runs inside Numba (`_drive`).
+    `strategy.on_event` is plain Python, so that path pops the event queue
+    in chunks into NumPy columns and hands the events to the callback one
+    by one.
     """
-    bids_p, bids_q, asks_p, asks_q, idx_map = init_book()
-    eq = EventQueue()
-    trades = List.empty_list(Trade.class_type.instance_type)
+    # resolve the callback once, not per event
+    on_event = getattr(strategy, "on_event", None)
+
+    if on_event is None:
+        offsets, columns = _pack_events([events])
+        n_events = int(offsets[-1])
+        book = init_book(max(n_events, 1))
+        trades, trades_idx = init_trades(n_events)
+        n_trades = _drive(*columns, *book, trades, trades_idx)
+        return trades[:n_trades].copy()
+
+    events = list(events)
+    eq = EventHeap(max(len(events), 1))
 
     # preload events
-    for ts, ev in events:
-        eq.push(ts, ev)
+    columns = _event_columns(events)
+    eq.push_many(*columns)
+
+    # every order can rest at most once and produces a bounded number of
+    # executions → size the order pool and trades buffer up front
+    book = init_book(max(len(eq), 1))
+    trades, trades_idx = init_trades(len(eq))
 
-    current_ts: TIMESTAMP = 0
-    # main loop
+    chunk = tuple(np.empty(_EVENT_CHUNK, dtype=col.dtype) for col in columns)
+    # main loop: pop the events in time order, one chunk per heap call.
+    # There is no clock to step, so idle stretches between timestamps cost
+    # nothing.
     while len(eq):
-        # pop events that are due
-        for ts, ev in eq.pop_until(current_ts):
-            if isinstance(ev, Order):
-                if ev.price == 0.0:  # treat price==0 as a pure market order
-                    process_market(ev, bids_p, bids_q, asks_p, asks_q, trades)
-                else:
-                    match_incoming(ev, bids_p, bids_q, asks_p, asks_q, trades)
-                    if ev.quantity > 0:
-                        add_limit(ev, bids_p, bids_q, asks_p, asks_q, idx_map)
+        n = eq.pop_due(_LAST_TS, *chunk)
+        for ts, order_id, price, quantity, side, timestamp in zip(
+                *(col[:n].tolist() for col in chunk)):
+            ev = Order(order_id, price, quantity, side, timestamp)
+            _on_order(ev, *book, trades, trades_idx)
+            on_event(ev, ts, trades[:trades_idx[0]])
+
+    return trades[:trades_idx[0]].copy()
+
+
+@njit(cache=True, parallel=True)
+def _drive_batch(offsets, ev_oid, ev_price, ev_qty, ev_side, ev_ts,
+                 books, trades, n_trades, ok):
+    """
+    Run `_drive` on each symbol's slice of the event columns against its
+    own book, one symbol per thread.  `ok[s]` is cleared if symbol `s`
+    stopped on a rejected order.
+
+    Symbol `s` owns events [offsets[s], offsets[s+1]), the matching trade
+    region [2*offsets[s], 2*offsets[s+1]) — enough for any order flow (see
+    `init_trades`) — and book `s` of `books` (from `init_books`).
+    """
+    # parfor bodies cannot capture nested tuples: unpack to plain arrays
+    # here and re-pack per symbol
+    (bids_p, bids_q, bids_o, asks_p, asks_q, asks_o, heads, idx_map, orders,
+     ht_offsets, pool_offsets) = books
+    keys, slots = idx_map
+    ord_id, ord_price, ord_qty, ord_side, ord_next, ord_prev, free = orders
+    for s in prange(offsets.shape[0] - 1):
+        lo = offsets[s]
+        hi = offsets[s + 1]
+        book = book_view(
+            (bids_p, bids_q, bids_o, asks_p, asks_q, asks_o, heads,
+             (keys, slots),
+             (ord_id, ord_price, ord_qty, ord_side, ord_next, ord_prev, free),
+             ht_offsets, pool_offsets), s)
+        ok[s] = _try_drive(ev_oid[lo:hi], ev_price[lo:hi], ev_qty[lo:hi],
+                           ev_side[lo:hi], ev_ts[lo:hi],
+                           *book, trades[2 * lo:2 * hi], n_trades[s:s + 1])
 
-            # strategy callback example (placeholder)
-            if strategy is not None and hasattr(strategy, "on_event"):
-                strategy.on_event(ev, ts, trades)
 
-        current_ts += 1  # advance clock (1 µs step for demo)
+def run_simulation_batch(
+    events_per_symbol: Sequence[Iterable[Tuple[TIMESTAMP, Event]]],
+) -> List[np.ndarray]:
+    """
+    Simulate many independent order books (one per symbol) in parallel.
+
+    Each entry of `events_per_symbol` is what `run_simulation` takes for a
+    single symbol.  Returns one `trade_dtype` record array per symbol.
+    Strategy callbacks are not supported here — the whole batch runs in
+    Numba.  An order the book rejects raises the same ValueError as in
+    `run_simulation`.
+    """
+    offsets, columns = _pack_events(events_per_symbol)
+    n_symbols = offsets.shape[0] - 1
+    n_events = int(offsets[-1])
 
-    return list(trades)
+    # each symbol's order index is sized from its own event count
+    books = init_books(np.diff(offsets))
+    trades, _ = init_trades(n_events)
+    n_trades = np.zeros(n_symbols, dtype=np.int64)
+    ok = np.ones(n_symbols, dtype=np.bool_)
+
+    _drive_batch(offsets, *columns, books, trades, n_trades, ok)
+
+    for s in np.flatnonzero(~ok):
+        # replay the failing symbol on its own to re-raise its error
+        lo, hi = offsets[s], offsets[s + 1]
+        _drive(*(col[lo:hi] for col in columns), *init_book(hi - lo),
+               *init_trades(hi - lo))
+
+    return [
+        trades[2 * offsets[s]:2 * offsets[s] + n_trades[s]].copy()
+        for s in range(n_symbols)
+    ]
 
 
 # ───────────────────────── sample run ─────────────────────────
 if __name__ == "__main__":
+    TICK_SIZE = 0.01
+
     demo_events: List[Tuple[int, Order]] = [
         # resting ask
-        (1, Order(order_id=1, price=100.0, quantity=10, side=ORDER_SIDE_SELL, timestamp=1)),
+        (1, Order(order_id=1, price=price_to_ticks(100.0, TICK_SIZE), quantity=10, side=ORDER_SIDE_SELL, timestamp=1)),
         # incoming crossing bid
-        (2, Order(order_id=2, price=101.0, quantity=10, side=ORDER_SIDE_BUY, timestamp=2)),
+        (2, Order(order_id=2, price=price_to_ticks(101.0, TICK_SIZE), quantity=10, side=ORDER_SIDE_BUY, timestamp=2)),
         # non‑crossing bid
-        (3, Order(order_id=3, price=99.0, quantity=5, side=ORDER_SIDE_BUY, timestamp=3)),
-        # market sell (price=0.0 means market)
-        (4, Order(order_id=4, price=0.0, quantity=5, side=ORDER_SIDE_SELL, timestamp=4)),
+        (3, Order(order_id=3, price=price_to_ticks(99.0, TICK_SIZE), quantity=5, side=ORDER_SIDE_BUY, timestamp=3)),
+        # market sell (price=0 means market)
+        (4, Order(order_id=4, price=0, quantity=5, side=ORDER_SIDE_SELL, timestamp=4)),
     ]
 
     trades_out = run_simulation(demo_events)
     print("Executed trades:")
     for tr in trades_out:
+        price = ticks_to_price(tr['price'], TICK_SIZE)
         print(
-            f"    ts={tr.timestamp:3d} price={tr.price:6.2f} qty={tr.quantity:3d} "
-            f"(maker={tr.maker_order_id}, taker={tr.taker_order_id})"
+            f"    ts={tr['timestamp']:3d} price={price:6.2f} "
+            f"qty={tr['quantity']:3d} "
+            f"(maker={tr['maker_order_id']}, taker={tr['taker_order_id']})"
         )
\ No newline at end of file
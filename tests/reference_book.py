@@ -0,0 +1,80 @@
+"""
+Plain-Python reference order book used to cross-check the Numba engine.
+
+Price-time priority with one FIFO queue of [order_id, qty] per price; a
+price of 0 is a market order.  Like the engine, each side keeps at most
+MAX_LEVELS price levels and drops the worst one when a new level overflows
+it.
+"""
+
+from collections import deque
+
+from core.datatypes import ORDER_SIDE_BUY
+from core.order_book import MAX_LEVELS
+
+
+class RefBook:
+    def __init__(self):
+        self.bids = {}      # price → deque([order_id, qty])
+        self.asks = {}
+        self.where = {}     # resting order_id → (side dict, price)
+
+    def submit(self, order_id, price, quantity, side, timestamp):
+        """Match, then rest any remainder; returns the trades as tuples."""
+        trades = []
+        is_market = price == 0
+        is_buy = side == ORDER_SIDE_BUY
+        opp = self.asks if is_buy else self.bids
+        while quantity > 0 and opp:
+            best = min(opp) if is_buy else max(opp)
+            if not is_market and side * price < side * best:
+                break
+            queue = opp[best]
+            maker = queue[0]
+            qty = min(quantity, maker[1])
+            trades.append((maker[0], order_id, best, qty, timestamp))
+            quantity -= qty
+            maker[1] -= qty
+            if maker[1] == 0:
+                queue.popleft()
+                del self.where[maker[0]]
+                if not queue:
+                    del opp[best]
+        if quantity > 0 and not is_market:
+            own = self.bids if is_buy else self.asks
+            own.setdefault(price, deque()).append([order_id, quantity])
+            self.where[order_id] = (own, price)
+            if len(own) > MAX_LEVELS:
+                worst = min(own) if is_buy else max(own)
+                for dropped, _ in own.pop(worst):
+                    del self.where[dropped]
+        return trades
+
+    def cancel(self, order_id):
+        if order_id not in self.where:
+            return False
+        own, price = self.where.pop(order_id)
+        queue = own[price]
+        for k, (oid, _) in enumerate(queue):
+            if oid == order_id:
+                del queue[k]
+                break
+        if not queue:
+            del own[price]
+        return True
+
+    def levels(self, side):
+        """[(price, aggregate qty)] from best to worst."""
+        book = self.bids if side == ORDER_SIDE_BUY else self.asks
+        prices = sorted(book, reverse=side == ORDER_SIDE_BUY)
+        return [(p, sum(q for _, q in book[p])) for p in prices]
+
+
+def reference_trades(events):
+    """Replay (ts, Order) pairs in time order (FIFO on ties)."""
+    book = RefBook()
+    trades = []
+    for _, ev in sorted(events, key=lambda item: item[0]):
+        trades += book.submit(ev.order_id, ev.price, ev.quantity, ev.side,
+                              ev.timestamp)
+    return trades
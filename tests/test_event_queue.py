@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from core.event_queue import EventHeap
+
+
+def test_equal_timestamps_pop_fifo():
+    eq = EventHeap(2)                  # forces growth
+    for i, ts in enumerate((5, 3, 5, 3, 1, 5)):
+        eq.push(ts, i, 0, 1, 1, ts)
+    popped = [eq.pop()[:2] for _ in range(len(eq))]
+    assert popped == [(1, 4), (3, 1), (3, 3), (5, 0), (5, 2), (5, 5)]
+
+
+def test_empty_heap_raises_and_stays_usable():
+    eq = EventHeap()
+    with pytest.raises(IndexError):
+        eq.pop()
+    with pytest.raises(IndexError):
+        eq.peek_ts()
+    assert len(eq) == 0
+
+    eq.push(4, 1, 100, 5, 1, 4)
+    assert eq.peek_ts() == 4
+    assert eq.pop()[:2] == (4, 1)
+    assert len(eq) == 0
+
+
+def test_pop_if_due_flags_nothing_due():
+    eq = EventHeap()
+    assert eq.pop_if_due(100)[0] is False
+
+    eq.push(-1, 7, 100, 5, -1, -1)     # -1 is a legal timestamp
+    eq.push(3, 8, 100, 5, 1, 3)
+    assert eq.pop_if_due(-2)[0] is False
+    assert eq.pop_if_due(-1) == (True, -1, 7, 100, 5, -1, -1)
+    assert eq.pop_if_due(2)[0] is False
+    assert eq.pop_if_due(3) == (True, 3, 8, 100, 5, 1, 3)
+    assert len(eq) == 0
+
+
+def test_pop_due_drains_in_chunks():
+    n = 10
+    ts = np.array([3, 1, 3, 2, 1, 9, 3, 2, 1, 3], dtype=np.int64)
+    ids = np.arange(n, dtype=np.int64)
+    eq = EventHeap()
+    eq.push_many(ts, ids, np.zeros(n, np.int64), ids, ids, ts)
+
+    out_ts, out_ids = np.empty(4, np.int64), np.empty(4, np.int64)
+    out = (out_ts, out_ids, np.empty(4, np.int64), np.empty(4, np.int64),
+           np.empty(4, np.int64), np.empty(4, np.int64))
+    popped = []
+    for bound, expected in ((2, 4), (2, 1), (2, 0), (3, 4), (3, 0)):
+        k = eq.pop_due(bound, *out)
+        assert k == expected
+        popped += list(zip(out_ts[:k], out_ids[:k]))
+    assert popped == [(1, 1), (1, 4), (1, 8), (2, 3), (2, 7),
+                      (3, 0), (3, 2), (3, 6), (3, 9)]
+    assert len(eq) == 1 and eq.peek_ts() == 9
@@ -0,0 +1,363 @@
+import random
+
+import numpy as np
+import pytest
+
+from core.datatypes import Order, ORDER_SIDE_BUY, ORDER_SIDE_SELL
+from core.order_book import (
+    MAX_LEVELS,
+    INF_PRICE,
+    QTY_MAX,
+    init_book,
+    init_books,
+    book_view,
+    init_trades,
+    add_limit,
+    cancel,
+    match_incoming,
+    top_of_book,
+    _find_pos,
+    _ht_put,
+    _ht_pop,
+    _ht_slot,
+    _NO_ORDER,
+)
+from tests.reference_book import RefBook
+
+
+def _levels(book, side):
+    """Live (price, qty) levels of one side, best first."""
+    bids_p, bids_q, _, asks_p, asks_q, _, heads, _, _ = book
+    if side == ORDER_SIDE_BUY:
+        prices, qtys, h = bids_p, bids_q, heads[0]
+    else:
+        prices, qtys, h = asks_p, asks_q, heads[1]
+    return [(int(p), int(q)) for p, q in zip(prices[h:], qtys[h:]) if q > 0]
+
+
+def _top(book):
+    bids_p, bids_q, _, asks_p, asks_q, _, heads, _, _ = book
+    return tuple(int(x) for x in
+                 top_of_book(bids_p, bids_q, asks_p, asks_q, heads))
+
+
+def _submit(book, trades, trades_idx, order_id, price, qty, side):
+    """Route one order like the simulator: price 0 is a market order."""
+    order = Order(order_id, price, qty, side, order_id)
+    limit = INF_PRICE * side if price == 0 else price
+    match_incoming(order, *book, trades, trades_idx, limit)
+    if order.quantity > 0 and price != 0:
+        add_limit(order, *book)
+
+
+def _trades(trades, trades_idx):
+    return [tuple(t) for t in trades[:trades_idx[0]].tolist()]
+
+
+# ──────────────────────────── book layout ────────────────────────────────
+def test_side_deeper_than_max_levels_drops_worst_level():
+    book = init_book(4 * MAX_LEVELS)
+    ref = RefBook()
+    for i in range(MAX_LEVELS + 5):
+        price = 1000 - i if i % 2 else 500 + i   # interleave best / worst
+        add_limit(Order(i, price, 1, ORDER_SIDE_BUY, 0), *book)
+        ref.submit(i, price, 1, ORDER_SIDE_BUY, 0)
+        assert _levels(book, ORDER_SIDE_BUY) == ref.levels(ORDER_SIDE_BUY)
+    assert len(_levels(book, ORDER_SIDE_BUY)) == MAX_LEVELS
+
+    # orders on dropped levels are gone from the index too
+    for i in range(MAX_LEVELS + 5):
+        assert cancel(i, *book) == ref.cancel(i)
+    assert _levels(book, ORDER_SIDE_BUY) == []
+
+
+@pytest.mark.parametrize("n_levels", [0, 1, 7, 8, 9, 100, MAX_LEVELS])
+def test_find_pos_matches_linear_scan(n_levels):
+    rng = random.Random(n_levels)
+    live = sorted(rng.sample(range(1, 1000), n_levels))
+    bids_p = np.full(MAX_LEVELS, -1, dtype=np.int64)
+    asks_p = np.full(MAX_LEVELS, INF_PRICE, dtype=np.int64)
+    bids_p[:n_levels] = live[::-1]
+    asks_p[:n_levels] = live
+    for price in range(0, 1002):
+        assert _find_pos(bids_p, price, True) == sum(p > price for p in bids_p)
+        assert _find_pos(asks_p, price, False) == sum(p < price for p in asks_p)
+
+
+def test_tombstones_are_skipped_and_compacted():
+    book = init_book(4 * MAX_LEVELS)
+    trades, trades_idx = init_trades(4 * MAX_LEVELS)
+    ref = RefBook()
+    bids_p, bids_q, heads = book[0], book[1], book[6]
+    for i in range(MAX_LEVELS):
+        add_limit(Order(i, 1000 - i, 1, ORDER_SIDE_BUY, 0), *book)
+        ref.submit(i, 1000 - i, 1, ORDER_SIDE_BUY, 0)
+
+    # cancel levels 1..4 and 10: tombstones keep their price, qty 0
+    for i in (1, 2, 3, 4, 10):
+        assert cancel(i, *book) and ref.cancel(i)
+    assert bids_p[10] == 990 and bids_q[10] == 0
+
+    # draining the head level skips the tombstones right behind it
+    _submit(book, trades, trades_idx, 1000, 1000, 1, ORDER_SIDE_SELL)
+    ref.submit(1000, 1000, 1, ORDER_SIDE_SELL, 1000)
+    assert heads[0] == 5
+    assert (bids_p[5], bids_q[5]) == (995, 1)
+
+    # a full side compacts its tombstones before dropping anything
+    for i in range(6):
+        add_limit(Order(2000 + i, 100 - i, 1, ORDER_SIDE_BUY, 0), *book)
+        ref.submit(2000 + i, 100 - i, 1, ORDER_SIDE_BUY, 0)
+    assert _levels(book, ORDER_SIDE_BUY) == ref.levels(ORDER_SIDE_BUY)
+    assert len(ref.levels(ORDER_SIDE_BUY)) == MAX_LEVELS
+
+
+def test_top_of_book_tracks_head_through_fills_and_cancels():
+    book = init_book(32)
+    trades, trades_idx = init_trades(32)
+    assert _top(book) == (-1, 0, INF_PRICE, 0)
+    for i, price in enumerate((100, 99, 98)):
+        add_limit(Order(i, price, 2, ORDER_SIDE_BUY, 0), *book)
+        add_limit(Order(10 + i, price + 5, 3, ORDER_SIDE_SELL, 0), *book)
+    add_limit(Order(20, 100, 4, ORDER_SIDE_BUY, 0), *book)
+    assert _top(book) == (100, 6, 103, 3)
+
+    _submit(book, trades, trades_idx, 30, 100, 6, ORDER_SIDE_SELL)
+    assert _top(book) == (99, 2, 103, 3)
+    assert cancel(11, *book)                     # tombstone at 104
+    assert cancel(12, *book)                     # head: skips 104
+    assert _top(book) == (99, 2, 105, 3)
+
+
+# ─────────────────────────────── cancel ──────────────────────────────────
+def test_cancel_at_head_and_deeper():
+    book = init_book(16)
+    for i, price in enumerate((100, 99, 98)):
+        add_limit(Order(i, price, 5, ORDER_SIDE_BUY, 0), *book)
+
+    assert cancel(1, *book)                      # deeper: leaves a tombstone
+    assert _levels(book, ORDER_SIDE_BUY) == [(100, 5), (98, 5)]
+    assert book[0][1] == 99 and book[1][1] == 0
+
+    assert cancel(0, *book)                      # head: retired, skips 99
+    assert book[6][0] == 2
+    assert _levels(book, ORDER_SIDE_BUY) == [(98, 5)]
+
+    assert not cancel(0, *book)
+    assert not cancel(42, *book)
+    assert cancel(2, *book)
+    assert _levels(book, ORDER_SIDE_BUY) == []
+    assert _top(book) == (-1, 0, INF_PRICE, 0)
+
+
+def test_head_advances_and_front_slots_are_reused():
+    book = init_book(16)
+    heads = book[6]
+    trades, trades_idx = init_trades(16)
+    for i, price in enumerate((106, 104, 102)):
+        add_limit(Order(i, price, 1, ORDER_SIDE_SELL, 0), *book)
+    _submit(book, trades, trades_idx, 10, 104, 2, ORDER_SIDE_BUY)
+    assert heads[1] == 2                         # two levels retired
+    assert _levels(book, ORDER_SIDE_SELL) == [(106, 1)]
+
+    add_limit(Order(11, 105, 1, ORDER_SIDE_SELL, 0), *book)
+    assert heads[1] == 1                         # prepend reuses a front slot
+    add_limit(Order(12, 108, 1, ORDER_SIDE_SELL, 0), *book)
+    assert _levels(book, ORDER_SIDE_SELL) == [(105, 1), (106, 1), (108, 1)]
+
+
+def test_side_refilled_past_max_levels_many_times():
+    book = init_book(16)
+    trades, trades_idx = init_trades(8 * MAX_LEVELS)
+    oid = 0
+    for _ in range(3 * MAX_LEVELS):
+        oid += 1
+        add_limit(Order(oid, 100 + oid, 1, ORDER_SIDE_SELL, 0), *book)
+        oid += 1
+        _submit(book, trades, trades_idx, oid, 0, 1, ORDER_SIDE_BUY)
+        assert _levels(book, ORDER_SIDE_SELL) == []
+    assert trades_idx[0] == 3 * MAX_LEVELS
+    add_limit(Order(0, 99, 1, ORDER_SIDE_SELL, 0), *book)
+    assert _levels(book, ORDER_SIDE_SELL) == [(99, 1)]
+
+
+def test_cancel_after_fill_takes_only_remaining_quantity():
+    book = init_book(16)
+    trades, trades_idx = init_trades(16)
+    add_limit(Order(1, 100, 10, ORDER_SIDE_BUY, 0), *book)
+    add_limit(Order(2, 100, 10, ORDER_SIDE_BUY, 0), *book)
+
+    _submit(book, trades, trades_idx, 3, 100, 10, ORDER_SIDE_SELL)
+    assert _trades(trades, trades_idx) == [(1, 3, 100, 10, 3)]
+    assert not cancel(1, *book)                  # fully filled, already gone
+    assert _levels(book, ORDER_SIDE_BUY) == [(100, 10)]
+
+    _submit(book, trades, trades_idx, 4, 100, 4, ORDER_SIDE_SELL)
+    assert cancel(2, *book)                      # 6 left, all of it removed
+    assert _levels(book, ORDER_SIDE_BUY) == []
+
+
+def test_fills_are_fifo_within_a_level():
+    book = init_book(16)
+    trades, trades_idx = init_trades(16)
+    for i, qty in enumerate((3, 4, 5)):
+        add_limit(Order(i, 100, qty, ORDER_SIDE_SELL, 0), *book)
+    add_limit(Order(3, 101, 2, ORDER_SIDE_SELL, 0), *book)
+    assert cancel(1, *book)
+
+    _submit(book, trades, trades_idx, 9, 101, 9, ORDER_SIDE_BUY)
+    assert _trades(trades, trades_idx) == [
+        (0, 9, 100, 3, 9),
+        (2, 9, 100, 5, 9),
+        (3, 9, 101, 1, 9),
+    ]
+    assert _levels(book, ORDER_SIDE_SELL) == [(101, 1)]
+
+
+def test_order_pool_bounds_resting_orders_not_total_orders():
+    book = init_book(2)
+    trades, trades_idx = init_trades(1000)
+    for i in range(0, 1000, 2):
+        _submit(book, trades, trades_idx, i, 100, 5, ORDER_SIDE_BUY)
+        _submit(book, trades, trades_idx, i + 1, 100, 5, ORDER_SIDE_SELL)
+    assert trades_idx[0] == 500
+
+    add_limit(Order(2000, 90, 1, ORDER_SIDE_BUY, 0), *book)
+    add_limit(Order(2001, 91, 1, ORDER_SIDE_BUY, 0), *book)
+    with pytest.raises(ValueError):
+        add_limit(Order(2002, 92, 1, ORDER_SIDE_BUY, 0), *book)
+
+
+def test_negative_order_ids_rest_and_cancel():
+    book = init_book(16)
+    for oid in (-1, -2, -(2 ** 63)):
+        add_limit(Order(oid, 100, 1, ORDER_SIDE_SELL, 0), *book)
+    assert _levels(book, ORDER_SIDE_SELL) == [(100, 3)]
+    assert cancel(-2, *book)
+    assert not cancel(-2, *book)
+    assert cancel(-(2 ** 63), *book)
+    assert cancel(-1, *book)
+    assert _levels(book, ORDER_SIDE_SELL) == []
+
+
+def test_market_sweep():
+    book = init_book(32)
+    trades, trades_idx = init_trades(32)
+    ref = RefBook()
+    for i in range(6):
+        price = 100 - i // 2
+        add_limit(Order(i, price, i + 1, ORDER_SIDE_BUY, 0), *book)
+        ref.submit(i, price, i + 1, ORDER_SIDE_BUY, 0)
+
+    _submit(book, trades, trades_idx, 10, 0, 8, ORDER_SIDE_SELL)
+    expected = ref.submit(10, 0, 8, ORDER_SIDE_SELL, 10)
+    assert _trades(trades, trades_idx) == expected
+    assert _levels(book, ORDER_SIDE_BUY) == ref.levels(ORDER_SIDE_BUY)
+
+    # larger than the whole side: sweeps it, the rest never rests
+    _submit(book, trades, trades_idx, 11, 0, 1000, ORDER_SIDE_SELL)
+    expected += ref.submit(11, 0, 1000, ORDER_SIDE_SELL, 11)
+    assert _trades(trades, trades_idx) == expected
+    assert _top(book) == (-1, 0, INF_PRICE, 0)
+
+
+# ──────────────────────────── order index ────────────────────────────────
+def test_order_index_insert_and_backward_shift_delete():
+    idx_map = init_book(256)[7]
+    rng = random.Random(3)
+    ref = {}
+    for _ in range(50000):
+        key = rng.randrange(-200, 200)
+        if key not in ref and len(ref) < 256 and rng.random() < 0.5:
+            _ht_put(idx_map, key, key + 200)
+            ref[key] = key + 200
+        else:
+            found, slot = _ht_pop(idx_map, key)
+            assert found == (key in ref)
+            if found:
+                assert slot == ref.pop(key)
+    for key, slot in ref.items():
+        assert _ht_pop(idx_map, key) == (True, slot)
+    assert (idx_map[1] == _NO_ORDER).all()
+
+
+def test_order_index_probe_is_bounded():
+    idx_map = init_book(2)[7]
+    for key in range(idx_map[0].shape[0]):
+        _ht_put(idx_map, key, key)
+    assert _ht_slot(idx_map, 10 ** 6) == -1
+    assert _ht_pop(idx_map, 10 ** 6)[0] is False
+    with pytest.raises(ValueError):
+        _ht_put(idx_map, 10 ** 6, 0)
+
+
+def test_init_books_sizes_each_book_independently():
+    books = init_books(np.array([1, 3, 100, 0], dtype=np.int64))
+    ht_offsets, pool_offsets = books[-2], books[-1]
+    assert list(np.diff(ht_offsets)) == [2, 8, 256, 2]
+    assert list(np.diff(pool_offsets)) == [1, 3, 100, 1]
+
+    # books are independent views
+    big = book_view(books, 2)
+    small = book_view(books, 1)
+    for i in range(3):
+        add_limit(Order(i, 100 + i, 1, ORDER_SIDE_SELL, 0), *small)
+    for i in range(100):
+        add_limit(Order(i, 100 - i, 1, ORDER_SIDE_BUY, 0), *big)
+    assert _levels(small, ORDER_SIDE_SELL) == [(100, 1), (101, 1), (102, 1)]
+    assert _levels(small, ORDER_SIDE_BUY) == []
+    assert len(_levels(big, ORDER_SIDE_BUY)) == 100
+    with pytest.raises(ValueError):
+        add_limit(Order(3, 200, 1, ORDER_SIDE_SELL, 0), *small)
+
+
+# ───────────────────────────── quantities ────────────────────────────────
+@pytest.mark.parametrize("qty", [QTY_MAX + 1, 2 ** 31 + 5, 2 ** 32])
+def test_quantity_above_qty_max_is_rejected(qty):
+    book = init_book(4)
+    with pytest.raises(ValueError):
+        add_limit(Order(1, 100, qty, ORDER_SIDE_BUY, 0), *book)
+    assert _levels(book, ORDER_SIDE_BUY) == []
+    assert not cancel(1, *book)
+
+
+def test_level_total_above_qty_max_is_rejected():
+    book = init_book(4)
+    add_limit(Order(1, 100, QTY_MAX, ORDER_SIDE_SELL, 0), *book)
+    with pytest.raises(ValueError):
+        add_limit(Order(2, 100, 1, ORDER_SIDE_SELL, 0), *book)
+    assert _levels(book, ORDER_SIDE_SELL) == [(100, QTY_MAX)]
+    assert not cancel(2, *book)
+    # the rejected order took no pool slot
+    add_limit(Order(3, 101, 1, ORDER_SIDE_SELL, 0), *book)
+    add_limit(Order(4, 102, 1, ORDER_SIDE_SELL, 0), *book)
+    add_limit(Order(5, 103, 1, ORDER_SIDE_SELL, 0), *book)
+    assert len(_levels(book, ORDER_SIDE_SELL)) == 4
+
+
+# ─────────────────────────────── parity ──────────────────────────────────
+@pytest.mark.parametrize("seed, n, lo, hi", [
+    (0, 4000, 90, 110),
+    (1, 4000, 90, 110),
+    (2, 8000, 0, 180),
+    (3, 8000, 0, 1000),     # > MAX_LEVELS distinct prices: drops levels
+])
+def test_random_flow_matches_reference(seed, n, lo, hi):
+    rng = random.Random(seed)
+    book = init_book(n)
+    trades, trades_idx = init_trades(2 * n)
+    ref = RefBook()
+    expected = []
+    for i in range(n):
+        if i and rng.random() < 0.3:
+            k = rng.randrange(i)
+            assert cancel(k, *book) == ref.cancel(k)
+        else:
+            side = rng.choice((ORDER_SIDE_BUY, ORDER_SIDE_SELL))
+            price = 0 if rng.random() < 0.03 else rng.randint(lo, hi)
+            qty = rng.randint(1, 20)
+            _submit(book, trades, trades_idx, i, price, qty, side)
+            expected += ref.submit(i, price, qty, side, i)
+        assert _levels(book, ORDER_SIDE_BUY) == ref.levels(ORDER_SIDE_BUY)
+        assert _levels(book, ORDER_SIDE_SELL) == ref.levels(ORDER_SIDE_SELL)
+    assert _trades(trades, trades_idx) == expected
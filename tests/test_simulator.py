@@ -0,0 +1,91 @@
+import random
+
+import numpy as np
+import pytest
+
+import simulator
+from core.datatypes import Order, ORDER_SIDE_BUY, ORDER_SIDE_SELL
+from simulator import run_simulation, run_simulation_batch
+from tests.reference_book import reference_trades
+
+
+class _Recorder:
+    def __init__(self):
+        self.calls = 0
+
+    def on_event(self, ev, ts, trades):
+        self.calls += 1
+
+
+def _events(n, lo, hi, seed):
+    rng = random.Random(seed)
+    events = []
+    for i in range(n):
+        ts = rng.randint(0, n // 5)
+        price = 0 if rng.random() < 0.05 else rng.randint(lo, hi)
+        side = rng.choice((ORDER_SIDE_BUY, ORDER_SIDE_SELL))
+        events.append((ts, Order(i, price, rng.randint(1, 20), side, ts)))
+    return events
+
+
+def _as_tuples(trades):
+    return [tuple(t) for t in trades.tolist()]
+
+
+@pytest.mark.parametrize("chunk", [1, 7, simulator._EVENT_CHUNK])
+def test_strategy_path_matches_reference(monkeypatch, chunk):
+    monkeypatch.setattr(simulator, "_EVENT_CHUNK", chunk)
+    events = _events(3000, 90, 110, chunk)
+    expected = reference_trades(events)
+
+    recorder = _Recorder()
+    assert _as_tuples(run_simulation(events, strategy=recorder)) == expected
+    assert _as_tuples(run_simulation(events)) == expected
+    assert recorder.calls == len(events)
+
+
+@pytest.mark.parametrize("seed, lo, hi", [(0, 90, 110), (1, 0, 1000)])
+def test_all_paths_match_reference(seed, lo, hi):
+    events = _events(3000, lo, hi, seed)
+    expected = reference_trades(events)
+
+    fast = run_simulation(events)
+    recorder = _Recorder()
+    slow = run_simulation(events, strategy=recorder)
+    assert _as_tuples(fast) == expected
+    assert _as_tuples(slow) == expected
+    assert recorder.calls == len(events)
+    assert (fast["maker_order_id"] >= 0).all()
+
+
+def test_sparse_timestamps_do_not_tick_through_the_gaps():
+    events = [
+        (10 ** 15, Order(2, 100, 5, ORDER_SIDE_BUY, 10 ** 15)),
+        (-5, Order(1, 100, 5, ORDER_SIDE_SELL, -5)),
+    ]
+    trades = run_simulation(events, strategy=_Recorder())
+    assert _as_tuples(trades) == [(1, 2, 100, 5, 10 ** 15)]
+
+
+def test_batch_matches_single_symbol_runs():
+    symbols = [_events(500 + 300 * s, 90, 110, s) for s in range(5)]
+    symbols.insert(2, [])
+    out = run_simulation_batch(symbols)
+    assert len(out) == len(symbols)
+    for events, trades in zip(symbols, out):
+        assert np.array_equal(trades, run_simulation(events))
+        assert _as_tuples(trades) == reference_trades(events)
+    assert run_simulation_batch([]) == []
+
+
+@pytest.mark.parametrize("strategy", [None, _Recorder()])
+def test_quantity_above_int32_is_rejected(strategy):
+    events = [(0, Order(1, 100, 2 ** 32, ORDER_SIDE_BUY, 0))]
+    with pytest.raises(ValueError):
+        run_simulation(events, strategy=strategy)
+
+
+def test_quantity_above_int32_is_rejected_in_batch():
+    events = [(0, Order(1, 100, 2 ** 32, ORDER_SIDE_BUY, 0))]
+    with pytest.raises(ValueError):
+        run_simulation_batch([[], events])